@@ -0,0 +1,29 @@
+import argparse
+import csv
+import json
+import sys
+from datetime import datetime
+
+from config import Config
+from services.audit_log import iter_events
+
+CAMPOS = ['ts', 'accion', 'reserva_id', 'restaurant_id', 'actor_id', 'estado_anterior', 'estado', 'reserva_id_nuevo']
+
+parser = argparse.ArgumentParser(description='Consulta y exporta el historial de auditoría de reservas')
+parser.add_argument('--reserva', type=int, help='Solo eventos de esta reserva (incluye sus ids anteriores a un rebalanceo)')
+parser.add_argument('--actor', type=int, help='Solo eventos hechos por este usuario')
+parser.add_argument('--desde', type=datetime.fromisoformat, help='Fecha inicial (AAAA-MM-DD[THH:MM])')
+parser.add_argument('--hasta', type=datetime.fromisoformat, help='Fecha final (AAAA-MM-DD[THH:MM])')
+parser.add_argument('--formato', choices=['jsonl', 'csv'], default='jsonl')
+parser.add_argument('--dir', default=Config.AUDIT_DIR, help='Carpeta de segmentos de auditoría')
+args = parser.parse_args()
+
+eventos = iter_events(args.dir, reserva_id=args.reserva, actor_id=args.actor, desde=args.desde, hasta=args.hasta)
+
+if args.formato == 'csv':
+    writer = csv.DictWriter(sys.stdout, fieldnames=CAMPOS)
+    writer.writeheader()
+    writer.writerows(eventos)
+else:
+    for evento in eventos:
+        sys.stdout.write(json.dumps(evento, ensure_ascii=False) + '\n')
@@ -0,0 +1,72 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Proceso nuevo: importar, construir la app y atender la primera petición
+COLD_WORKER = """
+import time
+t0 = time.monotonic()
+from app import create_app
+app = create_app()
+app.test_client().get({path!r})
+print(time.monotonic() - t0)
+"""
+
+
+def cold_start(path, runs):
+    """Tiempo hasta la primera respuesta de un worker que arranca desde cero (sin --preload)"""
+    tiempos = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, '-c', COLD_WORKER.format(path=path)],
+            capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+        tiempos.append(float(out.stdout.strip().splitlines()[-1]))
+    return tiempos
+
+
+def preforked(path, runs):
+    """Tiempo desde el fork hasta la primera respuesta de un worker con la app precargada (--preload)"""
+    from app import create_app, post_fork, warm_up
+
+    app = create_app()
+    warm_up(app)
+
+    tiempos = []
+    for _ in range(runs):
+        r, w = os.pipe()
+        t0 = time.monotonic()
+        pid = os.fork()
+        if pid == 0:
+            os.close(r)
+            post_fork(app)
+            app.test_client().get(path)
+            os.write(w, str(time.monotonic() - t0).encode())
+            os._exit(0)
+        os.close(w)
+        with os.fdopen(r) as fh:
+            tiempos.append(float(fh.read()))
+        os.waitpid(pid, 0)
+    return tiempos
+
+
+def resumen(nombre, tiempos):
+    ms = [t * 1000 for t in tiempos]
+    print(f'   {nombre:<22} min {min(ms):8.1f} ms   mediana {statistics.median(ms):8.1f} ms   max {max(ms):8.1f} ms')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Mide el tiempo hasta la primera petición de cada worker')
+    parser.add_argument('--runs', type=int, default=5, help='Workers simulados por modo')
+    parser.add_argument('--path', default='/', help='Ruta de la primera petición')
+    args = parser.parse_args()
+
+    print('\n' + '='*60)
+    print(f'⏱️  Tiempo hasta la primera petición ({args.runs} workers, GET {args.path})')
+    print('='*60)
+    resumen('arranque en frío', cold_start(args.path, args.runs))
+    resumen('pre-fork (--preload)', preforked(args.path, args.runs))
+    print('='*60 + '\n')
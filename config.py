@@ -3,7 +3,34 @@ import os
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 SQLITE_PATH = os.path.join(BASE_DIR, 'reservas.db')
 
+# Modo particionado (services/sharding.py): 0 = una sola base de datos
+SHARD_COUNT = int(os.environ.get('SHARD_COUNT', '0'))
+SHARD_PATH_TEMPLATE = os.path.join(BASE_DIR, 'reservas_shard_{}.db')
+
 class Config:
     SQLALCHEMY_DATABASE_URI = f"sqlite:///{SQLITE_PATH}"
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Mesas y reservas de cada restaurante viven en su shard; usuarios y restaurantes en la global
+    SHARD_COUNT = SHARD_COUNT
+    SHARD_PATH_TEMPLATE = SHARD_PATH_TEMPLATE
+    SQLALCHEMY_BINDS = {f'shard_{i}': f"sqlite:///{SHARD_PATH_TEMPLATE.format(i)}" for i in range(SHARD_COUNT)}
     SECRET_KEY = os.environ.get('SECRET_KEY', 'cambia_esta_clave_para_produccion')
+
+    # Archivos estáticos con hash de contenido y caché inmutable (services/assets.py)
+    ASSET_FINGERPRINT = os.environ.get('ASSET_FINGERPRINT', '1') == '1'
+    ASSET_MAX_AGE = 31536000  # un año
+    # Compresión al vuelo de las respuestas HTML
+    COMPRESS_MIN_SIZE = 500  # bytes
+    COMPRESS_LEVEL = 6
+
+    # Disponibilidad en vivo (SSE): cada conexión abierta ocupa un hilo del worker
+    SSE_MAX_SUBSCRIBERS = 200  # por proceso; por encima se responde 503
+    # Carpeta de sockets para repartir los cambios entre workers (la define serve.py)
+    AVAILABILITY_BUS_DIR = os.environ.get('AVAILABILITY_BUS_DIR')
+
+    # Auditoría de reservas con escritura diferida (services/audit_log.py)
+    AUDIT_DIR = os.path.join(BASE_DIR, 'audit')
+    AUDIT_QUEUE_SIZE = 10000
+    AUDIT_BATCH_SIZE = 500
+    AUDIT_FLUSH_INTERVAL = 1.0  # segundos
+    AUDIT_SEGMENT_MAX_BYTES = 16 * 1024 * 1024
@@ -1,12 +1,15 @@
 from app import create_app
 from models import db, User, Restaurant, Table
 from services.factories import UserFactory
+from services import sharding
 
 app = create_app()
 app.app_context().push()
 
 # Crear tablas
 db.create_all()
+if sharding.is_enabled():
+    sharding.create_shards()
 
 # Crear usuario admin por defecto (si no existe) usando Factory Pattern
 if not User.query.filter_by(email='admin@example.com').first():
@@ -1,4 +1,6 @@
 # models.py
+import json
+from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
 
@@ -35,6 +37,7 @@ class Restaurant(db.Model):
 
 class Table(db.Model):
     __tablename__ = 'tables'
+    __table_args__ = {'sqlite_autoincrement': True}  # necesario para los rangos de id por shard
     id = db.Column(db.Integer, primary_key=True)
     numero = db.Column(db.Integer, nullable=False)
     capacidad = db.Column(db.Integer, nullable=False)
@@ -45,6 +48,7 @@ class Table(db.Model):
 
 class Reservation(db.Model):
     __tablename__ = 'reservations'
+    __table_args__ = {'sqlite_autoincrement': True}
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     restaurant_id = db.Column(db.Integer, db.ForeignKey('restaurants.id'), nullable=False)
@@ -59,3 +63,29 @@ class Reservation(db.Model):
 
     def __repr__(self):
         return f"<Reservation {self.id} {self.fecha_hora} personas={self.num_personas} estado={self.estado}>"
+
+class UserSummary(db.Model):
+    """
+    Resumen desnormalizado de las reservas de un usuario (lo mantiene UserSummaryService).
+    En modo particionado hay una fila por usuario en cada shard con la parte de sus reservas.
+    """
+    __tablename__ = 'user_summaries'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    pendientes = db.Column(db.Integer, nullable=False, default=0)
+    aceptadas = db.Column(db.Integer, nullable=False, default=0)
+    canceladas = db.Column(db.Integer, nullable=False, default=0)
+    proximas = db.Column(db.Text, nullable=False, default='[]')  # JSON compacto, ordenado por fecha
+
+    def proximas_reservas(self, ahora=None):
+        """Reservas activas futuras, con `fecha_hora` convertida a datetime."""
+        ahora = ahora or datetime.now()
+        reservas = []
+        for entrada in json.loads(self.proximas):
+            entrada['fecha_hora'] = datetime.fromisoformat(entrada['fecha_hora'])
+            if entrada['fecha_hora'] >= ahora:
+                reservas.append(entrada)
+        return reservas
+
+    def __repr__(self):
+        return f"<UserSummary user={self.user_id} total={self.total}>"
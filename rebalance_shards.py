@@ -0,0 +1,26 @@
+from app import create_app
+from services import sharding
+
+app = create_app()
+app.app_context().push()
+
+if not sharding.is_enabled():
+    print('❌ El modo particionado está desactivado. Define SHARD_COUNT (p.ej. SHARD_COUNT=4)')
+    raise SystemExit(1)
+
+# Crear los shards que falten y mover cada restaurante al suyo
+sharding.create_shards()
+movimientos = sharding.rebalance()
+
+print('\n' + '='*60)
+print(f'🔀 Rebalanceo completado: {len(sharding.shard_ids())} shards')
+print('='*60)
+for restaurant_id, origen, destino, mesas, reservas in movimientos:
+    print(f'   Restaurante {restaurant_id}: {origen} → {destino} ({len(mesas)} mesas, {len(reservas)} reservas)')
+    for viejo_id, nuevo_id in reservas.items():
+        print(f'      reserva {viejo_id} → {nuevo_id}')
+if movimientos:
+    print('   Los ids nuevos quedan registrados en la auditoría (acción "reubicada")')
+else:
+    print('   Todos los restaurantes ya estaban en su shard')
+print('='*60 + '\n')
@@ -0,0 +1,199 @@
+import argparse
+import os
+import shutil
+import signal
+import socket
+import tempfile
+import threading
+import time
+import traceback
+
+from werkzeug.serving import make_server
+from werkzeug.wsgi import ClosingIterator
+
+# Segundos que un worker espera a que terminen las peticiones en curso al parar
+GRACEFUL_TIMEOUT = 30
+
+
+class ActiveRequests:
+    """Middleware WSGI que cuenta las peticiones en curso para un apagado ordenado"""
+
+    def __init__(self, app):
+        self.app = app
+        self._count = 0
+        self._idle = threading.Condition()
+
+    def __call__(self, environ, start_response):
+        with self._idle:
+            self._count += 1
+        try:
+            return ClosingIterator(self.app(environ, start_response), self._done)
+        except BaseException:
+            self._done()
+            raise
+
+    def _done(self):
+        with self._idle:
+            self._count -= 1
+            self._idle.notify_all()
+
+    def wait_idle(self, timeout):
+        with self._idle:
+            return self._idle.wait_for(lambda: self._count == 0, timeout)
+
+
+def run_worker(sock, app):
+    from app import create_app, post_fork, warm_up
+    from services import availability_feed
+
+    if app is None:
+        # Sin --preload cada worker importa y construye la app: recoge código nuevo al recargar
+        app = create_app()
+        warm_up(app)
+    else:
+        post_fork(app)
+
+    tracker = ActiveRequests(app)
+    host, port = sock.getsockname()[:2]
+    server = make_server(host, port, tracker, threaded=True, fd=sock.fileno())
+
+    def shutdown():
+        # Los streams SSE no terminan solos: se cierran para no agotar GRACEFUL_TIMEOUT
+        availability_feed.broker.close()
+        availability_feed.bus.close()
+        server.shutdown()
+
+    def stop(signum, frame):
+        # shutdown() espera a que serve_forever() termine: no puede llamarse desde su hilo
+        threading.Thread(target=shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # el maestro reenvía Ctrl+C como SIGTERM
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+
+    server.serve_forever()
+    tracker.wait_idle(GRACEFUL_TIMEOUT)
+
+
+def spawn_worker(sock, app):
+    pid = os.fork()
+    if pid:
+        return pid
+
+    code = 1
+    try:
+        run_worker(sock, app)
+        code = 0
+    except Exception:
+        traceback.print_exc()
+    finally:
+        # os._exit no ejecuta atexit: volcar la auditoría pendiente antes de salir
+        from services.audit_log import audit_log
+        audit_log.close()
+        os._exit(code)
+
+
+class Master:
+    """
+    Proceso maestro pre-fork: abre el socket, opcionalmente construye la app
+    una sola vez (--preload) y mantiene N workers que comparten el socket.
+
+    Señales:
+        SIGHUP          recarga ordenada: arranca workers nuevos y luego para los viejos
+        SIGTERM/SIGINT  apagado ordenado de todos los workers
+    """
+
+    def __init__(self, sock, workers, preload):
+        self.sock = sock
+        self.num_workers = workers
+        self.preload = preload
+        self.app = None
+        self.workers = set()
+        self._reload = False
+        self._stop = False
+
+    def _load_app(self):
+        if self.preload:
+            from app import create_app, warm_up
+            self.app = create_app()
+            warm_up(self.app)
+
+    def _spawn(self, n):
+        return {spawn_worker(self.sock, self.app) for _ in range(n)}
+
+    def _signal_workers(self, pids, sig):
+        for pid in pids:
+            try:
+                os.kill(pid, sig)
+            except ProcessLookupError:
+                pass
+
+    def _reap(self):
+        while self.workers:
+            try:
+                pid, _status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.workers.clear()
+                return
+            if pid == 0:
+                return
+            if pid in self.workers:
+                self.workers.discard(pid)
+                if not self._stop:
+                    print(f'⚠️  Worker {pid} terminó inesperadamente, se reemplaza')
+                    self.workers |= self._spawn(1)
+
+    def run(self):
+        self._load_app()
+        self.workers = self._spawn(self.num_workers)
+        print(f'🚀 Sirviendo en http://{self.sock.getsockname()[0]}:{self.sock.getsockname()[1]} '
+              f'con {self.num_workers} workers (pid maestro {os.getpid()})')
+
+        signal.signal(signal.SIGHUP, lambda *_: setattr(self, '_reload', True))
+        signal.signal(signal.SIGTERM, lambda *_: setattr(self, '_stop', True))
+        signal.signal(signal.SIGINT, lambda *_: setattr(self, '_stop', True))
+
+        while not self._stop:
+            if self._reload:
+                self._reload = False
+                print('🔄 Recargando workers...')
+                viejos = self.workers
+                self._load_app()
+                self.workers = self._spawn(self.num_workers)
+                self._signal_workers(viejos, signal.SIGTERM)
+            self._reap()
+            time.sleep(0.5)
+
+        print('🛑 Deteniendo workers...')
+        self._signal_workers(self.workers, signal.SIGTERM)
+        limite = time.monotonic() + GRACEFUL_TIMEOUT + 5
+        while self.workers and time.monotonic() < limite:
+            self._reap()
+            time.sleep(0.1)
+        self._signal_workers(self.workers, signal.SIGKILL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Servidor multi-proceso de RestauBook')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--no-preload', dest='preload', action='store_false',
+                        help='Cada worker construye su propia app (la recarga con SIGHUP recoge código nuevo)')
+    args = parser.parse_args()
+
+    # Cada worker tiene su propio broker SSE: los cambios se reparten entre
+    # ellos por sockets Unix en esta carpeta (antes de importar la config)
+    bus_dir = tempfile.mkdtemp(prefix='restaubook-bus-')
+    os.environ['AVAILABILITY_BUS_DIR'] = bus_dir
+
+    sock = socket.create_server((args.host, args.port), backlog=2048)
+    sock.set_inheritable(True)
+    try:
+        Master(sock, args.workers, args.preload).run()
+    finally:
+        shutil.rmtree(bus_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
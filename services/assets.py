@@ -0,0 +1,150 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: sin él solo se sirve gzip
+    brotli = None
+
+
+class AssetPipeline:
+    """
+    Pipeline de archivos estáticos con huella de contenido (fingerprinting).
+
+    La primera vez que se necesita (o en `warm_up`) recorre la carpeta
+    `static/`, calcula un hash del contenido de cada archivo y lo guarda en
+    memoria junto con sus versiones precomprimidas (gzip y, si está
+    instalado, brotli).
+    `url_for('static', filename=...)` pasa a generar el nombre con hash,
+    que se sirve con Cache-Control inmutable de un año.
+    """
+
+    HASH_LENGTH = 12
+
+    def __init__(self, app=None):
+        self.manifest = {}  # nombre lógico -> nombre con hash
+        self._assets = {}   # nombre con hash -> datos del archivo
+        self._static_folder = None
+        self._built = False
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Registra los hooks en la aplicación (el manifiesto se construye al primer uso)"""
+        app.config.setdefault('ASSET_FINGERPRINT', True)
+        app.config.setdefault('ASSET_MAX_AGE', 31536000)
+        app.config.setdefault('COMPRESS_MIN_SIZE', 500)
+        app.config.setdefault('COMPRESS_LEVEL', 6)
+
+        self.max_age = app.config['ASSET_MAX_AGE']
+        self.min_size = app.config['COMPRESS_MIN_SIZE']
+        self.level = app.config['COMPRESS_LEVEL']
+
+        if app.config['ASSET_FINGERPRINT'] and app.static_folder:
+            self._static_folder = app.static_folder
+            app.url_defaults(self._rewrite_static_url)
+            self._send_static = app.view_functions['static']
+            app.view_functions['static'] = self._serve_static
+
+        app.after_request(self._compress_response)
+        app.extensions['assets'] = self
+
+    def ensure_built(self):
+        if self._built or self._static_folder is None:
+            return
+        with self._lock:
+            if not self._built:
+                self.build(self._static_folder)
+                self._built = True
+
+    def build(self, static_folder):
+        """Calcula los hashes y precomprime todos los archivos de `static/`"""
+        manifest, assets = {}, {}
+        for root, _dirs, files in os.walk(static_folder):
+            for name in files:
+                path = os.path.join(root, name)
+                filename = os.path.relpath(path, static_folder).replace(os.sep, '/')
+                with open(path, 'rb') as fh:
+                    data = fh.read()
+
+                digest = hashlib.sha256(data).hexdigest()[:self.HASH_LENGTH]
+                base, ext = os.path.splitext(filename)
+                hashed = f"{base}.{digest}{ext}"
+
+                encodings = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+                if brotli is not None:
+                    encodings['br'] = brotli.compress(data)
+
+                manifest[filename] = hashed
+                assets[hashed] = {
+                    'data': data,
+                    'etag': digest,
+                    'mimetype': mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+                    # Solo se guardan las versiones que realmente ahorran bytes
+                    'encodings': {k: v for k, v in encodings.items() if len(v) < len(data)},
+                }
+        self.manifest, self._assets = manifest, assets
+
+    def _rewrite_static_url(self, endpoint, values):
+        if endpoint != 'static':
+            return
+        self.ensure_built()
+        if values.get('filename') in self.manifest:
+            values['filename'] = self.manifest[values['filename']]
+
+    def _serve_static(self, filename):
+        self.ensure_built()
+        asset = self._assets.get(filename)
+        if asset is None:
+            # Nombres sin hash (o archivos añadidos tras el arranque)
+            return self._send_static(filename=filename)
+
+        encoding = _negotiate_encoding(asset['encodings'])
+        body = asset['encodings'][encoding] if encoding else asset['data']
+
+        response = Response(body, mimetype=asset['mimetype'])
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Cache-Control'] = f"public, max-age={self.max_age}, immutable"
+        # Cada codificación es una representación distinta: necesita su propio ETag fuerte
+        response.set_etag(f"{asset['etag']}-{encoding}" if encoding else asset['etag'])
+        return response.make_conditional(request)
+
+    def _compress_response(self, response):
+        """Comprime al vuelo las respuestas HTML que superan el umbral"""
+        if (response.mimetype != 'text/html'
+                or response.status_code != 200
+                or response.direct_passthrough
+                or 'Content-Encoding' in response.headers):
+            return response
+
+        data = response.get_data()
+        if len(data) < self.min_size:
+            return response
+
+        encoding = _negotiate_encoding(('br', 'gzip') if brotli is not None else ('gzip',))
+        if encoding == 'br':
+            response.set_data(brotli.compress(data, quality=min(self.level, 11)))
+        elif encoding == 'gzip':
+            response.set_data(gzip.compress(data, compresslevel=self.level))
+        else:
+            return response
+
+        response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        return response
+
+
+def _negotiate_encoding(available):
+    """Elige la mejor codificación aceptada por el cliente (br antes que gzip)"""
+    for encoding in ('br', 'gzip'):
+        if encoding in available and request.accept_encodings[encoding] > 0:
+            return encoding
+    return None
@@ -0,0 +1,207 @@
+import atexit
+import glob
+import heapq
+import json
+import mmap
+import os
+import queue
+import threading
+from datetime import datetime
+
+
+class AuditLog:
+    """
+    Registro de auditoría append-only de los cambios de estado de las reservas.
+
+    Las rutas solo encolan el evento en memoria; un hilo en segundo plano
+    los escribe por lotes en archivos de segmento JSONL que rotan al
+    alcanzar AUDIT_SEGMENT_MAX_BYTES. Si la cola se llena, la petición
+    espera a que haya sitio (o, pasado FULL_QUEUE_WAIT, escribe ella misma
+    el evento): se pierde latencia, nunca eventos.
+    Al terminar el proceso se vacía la cola y se hace fsync del segmento.
+    """
+
+    FULL_QUEUE_WAIT = 5.0  # segundos
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('AUDIT_DIR', os.path.join(app.root_path, 'audit'))
+        app.config.setdefault('AUDIT_QUEUE_SIZE', 10000)
+        app.config.setdefault('AUDIT_BATCH_SIZE', 500)
+        app.config.setdefault('AUDIT_FLUSH_INTERVAL', 1.0)
+        app.config.setdefault('AUDIT_SEGMENT_MAX_BYTES', 16 * 1024 * 1024)
+
+        self.directory = app.config['AUDIT_DIR']
+        self.queue_size = app.config['AUDIT_QUEUE_SIZE']
+        self.batch_size = app.config['AUDIT_BATCH_SIZE']
+        self.flush_interval = app.config['AUDIT_FLUSH_INTERVAL']
+        self.segment_max_bytes = app.config['AUDIT_SEGMENT_MAX_BYTES']
+        app.extensions['audit_log'] = self
+
+    def record(self, accion, reserva_id, restaurant_id, actor_id, estado_anterior=None, estado=None,
+               reserva_id_nuevo=None):
+        """
+        Encola un evento de auditoría (no toca disco en la petición).
+        `reserva_id_nuevo` solo se usa en 'reubicada': la reserva cambió de id al moverla de shard.
+        """
+        evento = {
+            'ts': datetime.now().isoformat(timespec='milliseconds'),
+            'accion': accion,
+            'reserva_id': reserva_id,
+            'restaurant_id': restaurant_id,
+            'actor_id': actor_id,
+            'estado_anterior': estado_anterior,
+            'estado': estado,
+            'reserva_id_nuevo': reserva_id_nuevo,
+        }
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(evento)
+        except queue.Full:
+            # Esperar a que el escritor haga sitio mantiene el segmento en orden;
+            # si no avanza (disco atascado, hilo muerto) se escribe aquí mismo
+            try:
+                self._queue.put(evento, timeout=self.FULL_QUEUE_WAIT)
+            except queue.Full:
+                with self._write_lock:
+                    self._write([evento])
+
+    def _ensure_started(self):
+        # Arranque perezoso y por proceso: tras un fork el hilo escritor no existe en el hijo
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            self._queue = queue.Queue(maxsize=self.queue_size)
+            self._write_lock = threading.Lock()
+            self._segment = None
+            self._segment_seq = 0
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, name='audit-log-writer', daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+            atexit.register(self.close)
+
+    def _run(self):
+        while not self._stop.is_set() or not self._queue.empty():
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            with self._write_lock:
+                self._write(batch)
+
+    def _write(self, eventos):
+        data = ''.join(json.dumps(e, separators=(',', ':')) + '\n' for e in eventos).encode('utf-8')
+        if self._segment is None or self._segment.tell() + len(data) > self.segment_max_bytes:
+            self._rotate()
+        self._segment.write(data)
+        self._segment.flush()
+
+    def _rotate(self):
+        if self._segment is not None:
+            os.fsync(self._segment.fileno())
+            self._segment.close()
+        self._segment_seq += 1
+        nombre = f"audit-{datetime.now():%Y%m%d%H%M%S}-{os.getpid()}-{self._segment_seq:04d}.jsonl"
+        self._segment = open(os.path.join(self.directory, nombre), 'ab')
+
+    def close(self):
+        """Vacía la cola y deja el segmento actual en disco (fsync)"""
+        if self._pid != os.getpid():
+            return
+        self._stop.set()
+        self._thread.join()
+        with self._write_lock:
+            if self._segment is not None:
+                os.fsync(self._segment.fileno())
+                self._segment.close()
+                self._segment = None
+        self._pid = None
+
+
+audit_log = AuditLog()
+
+
+def iter_events(directory, reserva_id=None, actor_id=None, desde=None, hasta=None):
+    """
+    Recorre los segmentos de auditoría y devuelve en orden cronológico los
+    eventos que cumplen los filtros. Cada worker escribe sus propios
+    segmentos, así que se mezclan por `ts` en lugar de leerlos uno tras
+    otro. Los archivos se leen con mmap y los filtros por id se comprueban
+    sobre los bytes antes de decodificar el JSON.
+
+    Args:
+        directory: Carpeta con los segmentos (AUDIT_DIR)
+        reserva_id: Solo eventos de esa reserva, también con los ids que
+            tuvo antes o después de moverla de shard ('reubicada')
+        actor_id: Solo eventos hechos por ese usuario
+        desde, hasta: Rango de fechas (datetime) del evento
+    """
+    paths = sorted(glob.glob(os.path.join(directory, 'audit-*.jsonl')))
+    reservas = []
+    if reserva_id is not None:
+        reservas = [f'"reserva_id":{i},'.encode() for i in _reserva_aliases(paths, int(reserva_id))]
+    actor = f'"actor_id":{int(actor_id)},'.encode() if actor_id is not None else None
+
+    def eventos(path):
+        for linea in _iter_lines([path]):
+            if reservas and not any(p in linea for p in reservas):
+                continue
+            if actor and actor not in linea:
+                continue
+            try:
+                evento = json.loads(linea)
+            except ValueError:
+                continue  # línea incompleta al final de un segmento
+            if desde or hasta:
+                ts = datetime.fromisoformat(evento['ts'])
+                if (desde and ts < desde) or (hasta and ts > hasta):
+                    continue
+            yield evento
+
+    # Dentro de un segmento los eventos ya están en orden; `ts` ISO se compara como texto
+    return heapq.merge(*(eventos(path) for path in paths), key=lambda e: e['ts'])
+
+
+def _iter_lines(paths):
+    for path in paths:
+        if os.path.getsize(path) == 0:
+            continue
+        with open(path, 'rb') as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield from iter(mm.readline, b'')
+
+
+def _reserva_aliases(paths, reserva_id):
+    """Todos los ids que ha tenido una reserva, siguiendo los eventos 'reubicada'"""
+    enlaces = {}
+    for linea in _iter_lines(paths):
+        if b'"accion":"reubicada"' not in linea:
+            continue
+        try:
+            evento = json.loads(linea)
+        except ValueError:
+            continue
+        viejo, nuevo = evento['reserva_id'], evento['reserva_id_nuevo']
+        enlaces.setdefault(viejo, set()).add(nuevo)
+        enlaces.setdefault(nuevo, set()).add(viejo)
+
+    ids, pendientes = {reserva_id}, [reserva_id]
+    while pendientes:
+        for otro in enlaces.get(pendientes.pop(), ()):
+            if otro not in ids:
+                ids.add(otro)
+                pendientes.append(otro)
+    return ids
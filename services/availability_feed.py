@@ -0,0 +1,367 @@
+import glob
+import json
+import os
+import queue
+import socket
+import threading
+from datetime import datetime, time, timedelta
+
+from flask import current_app
+
+from models import Table, db
+from services.reservation_service import ReservationService
+
+
+class AvailabilityBroker:
+    """
+    Pub/sub en memoria para los cambios de disponibilidad de mesas.
+
+    Cada suscriptor escucha un canal (restaurant_id, fecha) y tiene una cola
+    acotada. Si un suscriptor lento llena su cola se descartan sus eventos
+    pendientes y se le envía un RESYNC para que pida un snapshot completo,
+    así un cliente atascado nunca hace crecer la memoria del proceso.
+
+    Con el servidor de Werkzeug cada suscriptor ocupa un hilo del worker
+    mientras la conexión está abierta, por eso el número de suscriptores por
+    proceso está limitado (`SSE_MAX_SUBSCRIBERS`).
+    """
+
+    RESYNC = {'tipo': 'resync'}
+    CLOSED = {'tipo': 'cierre'}
+
+    def __init__(self, max_queue=32, max_subscribers=200):
+        self.max_queue = max_queue
+        self.max_subscribers = max_subscribers
+        self._lock = threading.Lock()
+        self._channels = {}  # (restaurant_id, fecha) -> set de colas
+        self._count = 0
+        self._closed = False
+
+    def subscribe(self, key):
+        """Devuelve la cola del suscriptor, o None si el proceso está lleno o cerrando"""
+        q = queue.Queue(maxsize=self.max_queue)
+        with self._lock:
+            if self._closed or self._count >= self.max_subscribers:
+                return None
+            self._channels.setdefault(key, set()).add(q)
+            self._count += 1
+        return q
+
+    def unsubscribe(self, key, q):
+        with self._lock:
+            subs = self._channels.get(key)
+            if subs is not None and q in subs:
+                subs.discard(q)
+                self._count -= 1
+                if not subs:
+                    del self._channels[key]
+
+    def has_subscribers(self, key):
+        return key in self._channels
+
+    def publish(self, key, event):
+        with self._lock:
+            subs = list(self._channels.get(key, ()))
+        for q in subs:
+            try:
+                q.put_nowait(event)
+            except queue.Full:
+                _replace(q, self.RESYNC)
+
+    def resync_all(self):
+        """Pide un snapshot completo a todos los suscriptores (se han perdido cambios)"""
+        with self._lock:
+            subs = [q for qs in self._channels.values() for q in qs]
+        for q in subs:
+            _replace(q, self.RESYNC)
+
+    def close(self):
+        """Cierra todos los streams abiertos para que el worker pueda parar sin esperar"""
+        with self._lock:
+            self._closed = True
+            subs = [q for qs in self._channels.values() for q in qs]
+        for q in subs:
+            _replace(q, self.CLOSED)
+
+
+def _replace(q, event):
+    """Descarta los eventos pendientes de la cola y deja solo `event`"""
+    try:
+        while True:
+            q.get_nowait()
+    except queue.Empty:
+        pass
+    try:
+        q.put_nowait(event)
+    except queue.Full:
+        pass
+
+
+broker = AvailabilityBroker()
+
+
+class AvailabilityBus:
+    """
+    Reparte los cambios de disponibilidad entre los workers de `serve.py`.
+
+    El broker vive en memoria de cada proceso: sin el bus, un cambio hecho
+    en un worker solo llegaría a los navegadores conectados a ese mismo
+    worker. Cada worker con suscriptores abre un socket Unix de datagramas
+    en AVAILABILITY_BUS_DIR; al publicar se envía el cambio (no la
+    ocupación) al socket de los demás workers, y cada uno consulta la base
+    de datos solo si tiene a alguien escuchando ese día.
+
+    La cola de un socket de datagramas es muy corta (net.unix.max_dgram_qlen).
+    Si un worker no tiene sitio, su cambio se descarta y el worker queda
+    pendiente: en cuanto vuelve a tener sitio se le envía un RESYNC y todos
+    sus suscriptores piden un snapshot completo.
+    """
+
+    RESYNC = {'tipo': 'resync'}
+    RETRY_INTERVAL = 0.05  # segundos entre reintentos de RESYNC
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._sock = None
+        self._path = None
+        self._pendientes = set()  # sockets de workers que han perdido algún cambio
+        self._retry_pid = None
+
+    @staticmethod
+    def _socket_path(directory, pid):
+        return os.path.join(directory, f'worker-{pid}.sock')
+
+    def start(self, app):
+        """Empieza a recibir los cambios de los demás workers (una vez por proceso)"""
+        directory = app.config.get('AVAILABILITY_BUS_DIR')
+        if not directory or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # Arranque perezoso y por proceso, como el hilo de la auditoría
+            path = self._socket_path(directory, os.getpid())
+            if os.path.exists(path):
+                os.unlink(path)  # socket de un proceso anterior con el mismo pid
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sock.bind(path)
+            self._sock, self._path, self._pid = sock, path, os.getpid()
+            threading.Thread(target=self._run, args=(app, sock), name='availability-bus', daemon=True).start()
+
+    def send(self, directory, cambio):
+        """Envía el cambio a los demás workers sin bloquear la petición"""
+        if not directory:
+            return
+        data = json.dumps(cambio).encode()
+        propio = self._socket_path(directory, os.getpid())
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as out:
+            out.setblocking(False)
+            for path in glob.glob(self._socket_path(directory, '*')):
+                if path == propio:
+                    continue
+                if _sendto(out, data, path) is False:
+                    self._mark_pending(path)
+
+    def _mark_pending(self, path):
+        with self._lock:
+            if self._retry_pid != os.getpid():
+                # Primer fallo en este proceso (tras un fork no hay hilo de reintentos)
+                self._pendientes = set()
+                self._retry_pid = os.getpid()
+                threading.Thread(target=self._retry, name='availability-bus-retry', daemon=True).start()
+            self._pendientes.add(path)
+
+    def _retry(self):
+        data = json.dumps(self.RESYNC).encode()
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as out:
+            out.setblocking(False)
+            while True:
+                threading.Event().wait(self.RETRY_INTERVAL)
+                with self._lock:
+                    pendientes = list(self._pendientes)
+                enviados = [path for path in pendientes if _sendto(out, data, path) is not False]
+                with self._lock:
+                    self._pendientes.difference_update(enviados)
+                    if not self._pendientes:
+                        self._retry_pid = None
+                        return
+
+    def _run(self, app, sock):
+        while True:
+            try:
+                data = sock.recv(65536)
+            except OSError:
+                return  # socket cerrado en close()
+            cambio = json.loads(data)
+            if cambio == self.RESYNC:
+                broker.resync_all()  # otro worker no pudo enviarnos algún cambio
+                continue
+            try:
+                with app.app_context():
+                    _publish_local(cambio['restaurant_id'], cambio['table_id'],
+                                   datetime.fromisoformat(cambio['fecha_hora']), cambio['accion'])
+            except Exception:
+                app.logger.exception('Error publicando un cambio de disponibilidad de otro worker')
+
+    def close(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            try:
+                os.unlink(self._path)
+            except OSError:
+                pass
+            self._sock.close()
+            self._pid = None
+
+
+def _sendto(out, data, path):
+    """
+    Returns:
+        True si se envió, False si el receptor no tiene sitio,
+        None si el worker ya no existe (se borra su socket)
+    """
+    try:
+        out.sendto(data, path)
+        return True
+    except BlockingIOError:
+        return False
+    except (ConnectionRefusedError, FileNotFoundError):
+        # El worker terminó sin borrar su socket
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+        return None
+
+
+bus = AvailabilityBus()
+
+HEARTBEAT_SECONDS = 15
+
+
+def init_app(app):
+    app.config.setdefault('SSE_MAX_SUBSCRIBERS', 200)
+    app.config.setdefault('AVAILABILITY_BUS_DIR', None)
+    broker.max_subscribers = app.config['SSE_MAX_SUBSCRIBERS']
+
+
+def _day_range(fecha):
+    """Rango de tiempo que afecta a una reserva que empieza el día `fecha`"""
+    desde = datetime.combine(fecha, time.min)
+    return desde, desde + timedelta(days=1) + ReservationService.RESERVATION_WINDOW
+
+
+def _serialize(intervalos):
+    return [[inicio.isoformat(timespec='minutes'), fin.isoformat(timespec='minutes')]
+            for inicio, fin in intervalos]
+
+
+def _sse(evento, payload):
+    return f"event: {evento}\ndata: {json.dumps(payload)}\n\n"
+
+
+def publish_reservation_change(restaurant_id, table_id, fecha_hora, accion):
+    """
+    Publica la nueva ocupación de la mesa afectada en los canales de los
+    días cuya disponibilidad cambia, en este worker y, a través del bus,
+    en los demás. Solo consulta la base de datos si hay alguien escuchando.
+    Nunca lanza excepciones: los errores se registran en el log.
+    """
+    if table_id is None:
+        return
+
+    # El feed es best effort: el cambio ya está guardado y un fallo aquí
+    # no debe convertir la reserva, cancelación o cambio de estado en un 500
+    try:
+        _publish_local(restaurant_id, table_id, fecha_hora, accion)
+    except Exception:
+        current_app.logger.exception('Error publicando un cambio de disponibilidad')
+    try:
+        bus.send(current_app.config.get('AVAILABILITY_BUS_DIR'), {
+            'restaurant_id': restaurant_id,
+            'table_id': table_id,
+            'fecha_hora': fecha_hora.isoformat(),
+            'accion': accion,
+        })
+    except Exception:
+        current_app.logger.exception('Error enviando un cambio de disponibilidad a los demás workers')
+
+
+def _publish_local(restaurant_id, table_id, fecha_hora, accion):
+    ventana = ReservationService.RESERVATION_WINDOW
+    fechas = {(fecha_hora - ventana).date(), fecha_hora.date(), (fecha_hora + ventana).date()}
+    for fecha in sorted(fechas):
+        key = (restaurant_id, fecha)
+        if not broker.has_subscribers(key):
+            continue
+        desde, hasta = _day_range(fecha)
+        ocupadas = ReservationService.get_busy_intervals(restaurant_id, desde, hasta, table_id=table_id)
+        broker.publish(key, {
+            'tipo': 'delta',
+            'accion': accion,
+            'table_id': table_id,
+            'ocupado': _serialize(ocupadas.get(table_id, [])),
+        })
+
+
+def snapshot(restaurant_id, fecha):
+    """Ocupación completa de todas las mesas del restaurante para ese día"""
+    desde, hasta = _day_range(fecha)
+    mesas = Table.query.with_entities(Table.id).filter_by(restaurant_id=restaurant_id).all()
+    ocupadas = ReservationService.get_busy_intervals(restaurant_id, desde, hasta)
+    # Liberar la conexión: el stream puede quedarse abierto durante horas
+    db.session.remove()
+    return {
+        'tipo': 'snapshot',
+        'mesas': {str(mesa_id): _serialize(ocupadas.get(mesa_id, [])) for (mesa_id,) in mesas},
+    }
+
+
+def stream(restaurant_id, fecha):
+    """
+    Suscribe al canal (restaurant_id, fecha) y envía el snapshot inicial.
+
+    El generador no retiene el contexto de la petición: solo vuelve a abrir
+    un contexto de aplicación cuando tiene que enviar un snapshot nuevo.
+
+    Returns:
+        tuple: (generador de eventos SSE, función que cierra la suscripción),
+        o None si el proceso ya atiende el máximo de suscriptores
+    """
+    key = (restaurant_id, fecha)
+    q = broker.subscribe(key)
+    if q is None:
+        return None
+    app = current_app._get_current_object()
+    try:
+        bus.start(app)
+        inicial = snapshot(restaurant_id, fecha)
+    except BaseException:
+        broker.unsubscribe(key, q)
+        raise
+
+    def eventos():
+        try:
+            yield "retry: 5000\n\n"
+            yield _sse('snapshot', inicial)
+            while True:
+                try:
+                    evento = q.get(timeout=HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ": ping\n\n"
+                    continue
+                if evento is AvailabilityBroker.CLOSED:
+                    return  # el navegador se reconecta a otro worker
+                if evento is AvailabilityBroker.RESYNC:
+                    with app.app_context():
+                        datos = snapshot(restaurant_id, fecha)
+                    yield _sse('snapshot', datos)
+                else:
+                    yield _sse('delta', evento)
+        finally:
+            broker.unsubscribe(key, q)
+
+    # También al cerrar una respuesta cuyo generador nunca llegó a empezar
+    return eventos(), lambda: broker.unsubscribe(key, q)
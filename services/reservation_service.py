@@ -1,4 +1,5 @@
 from models import Reservation, Table, db
+from services.user_summary import UserSummaryService
 from datetime import timedelta
 
 class ReservationBuilder:
@@ -95,6 +96,7 @@ class ReservationService:
         # Si el usuario elige una mesa específica
         if reservation.table_id:
             conflict = Reservation.query.filter(
+                Reservation.restaurant_id == reservation.restaurant_id,
                 Reservation.table_id == reservation.table_id,
                 Reservation.fecha_hora.between(start, end),
                 Reservation.estado != 'CANCELADA'
@@ -102,6 +104,8 @@ class ReservationService:
             if conflict:
                 return False, 'La mesa seleccionada no está disponible en ese horario.'
             db.session.add(reservation)
+            db.session.flush()
+            UserSummaryService.reservation_created(reservation)
             db.session.commit()
             return True, reservation
 
@@ -113,6 +117,7 @@ class ReservationService:
 
         for table in candidates:
             conflict = Reservation.query.filter(
+                Reservation.restaurant_id == reservation.restaurant_id,
                 Reservation.table_id == table.id,
                 Reservation.fecha_hora.between(start, end),
                 Reservation.estado != 'CANCELADA'
@@ -120,6 +125,8 @@ class ReservationService:
             if not conflict:
                 reservation.table_id = table.id
                 db.session.add(reservation)
+                db.session.flush()
+                UserSummaryService.reservation_created(reservation)
                 db.session.commit()
                 return True, reservation
 
@@ -153,4 +160,36 @@ class ReservationService:
 
         mesas_disponibles = [m for m in mesas if m.id not in mesas_ocupadas_ids]
 
-        return mesas_disponibles    
\ No newline at end of file
+        return mesas_disponibles
+
+    @staticmethod
+    def get_busy_intervals(restaurant_id, desde, hasta, table_id=None):
+        """
+        Devuelve los intervalos ocupados de cada mesa que se cruzan con [desde, hasta).
+
+        Args:
+            restaurant_id: ID del restaurante
+            desde: Inicio del rango consultado
+            hasta: Fin del rango consultado
+            table_id: Si se indica, solo se consulta esa mesa
+
+        Returns:
+            dict: {table_id: [(inicio, fin), ...]} ordenado por inicio
+        """
+        query = Reservation.query.filter(
+            Reservation.restaurant_id == restaurant_id,
+            Reservation.table_id.isnot(None),
+            Reservation.fecha_hora < hasta,
+            Reservation.fecha_hora > desde - ReservationService.RESERVATION_WINDOW,
+            Reservation.estado != 'CANCELADA'
+        )
+        if table_id is not None:
+            query = query.filter(Reservation.table_id == table_id)
+
+        ocupadas = {}
+        for reserva in query.order_by(Reservation.fecha_hora).all():
+            inicio = reserva.fecha_hora
+            ocupadas.setdefault(reserva.table_id, []).append(
+                (inicio, inicio + ReservationService.RESERVATION_WINDOW)
+            )
+        return ocupadas
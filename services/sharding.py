@@ -0,0 +1,327 @@
+import glob
+import heapq
+import itertools
+import re
+
+import sqlalchemy as sa
+from flask import current_app
+from flask_sqlalchemy.session import Session
+from sqlalchemy.ext.horizontal_shard import ShardedSession
+from sqlalchemy.sql import operators, visitors
+
+from models import Reservation, Table, UserSummary, db
+from services.audit_log import audit_log
+
+GLOBAL = 'global'
+SHARDED_TABLES = {Table.__tablename__, Reservation.__tablename__, UserSummary.__tablename__}
+
+# Cada shard genera ids en su propio rango: [(k + 1) * SPAN, (k + 2) * SPAN).
+# Así el id de una mesa o reserva basta para saber en qué shard vive.
+SHARD_ID_SPAN = 10 ** 12
+
+
+def is_enabled():
+    return current_app.config.get('SHARD_COUNT', 0) > 0
+
+
+def shard_key(index):
+    return f'shard_{index}'
+
+
+def shard_ids():
+    return [shard_key(i) for i in range(current_app.config['SHARD_COUNT'])]
+
+
+def shard_for(restaurant_id):
+    """Función de enrutado: a qué shard pertenece un restaurante"""
+    return shard_key(int(restaurant_id) % current_app.config['SHARD_COUNT'])
+
+
+def shard_for_id(pk):
+    """Shard donde vive una mesa o reserva según su id (None si no es de ningún shard)"""
+    index = int(pk) // SHARD_ID_SPAN - 1
+    if 0 <= index < current_app.config['SHARD_COUNT']:
+        return shard_key(index)
+    return None
+
+
+def _is_sharded(mapper):
+    return mapper is not None and sa.inspect(mapper).local_table.name in SHARDED_TABLES
+
+
+def _instance_shard(instance):
+    # El resumen de un usuario tiene una parte en cada shard: UserSummaryService indica cuál
+    if isinstance(instance, UserSummary):
+        return instance._shard_id
+    return shard_for(instance.restaurant_id)
+
+
+def _shard_from_criteria(clause):
+    """
+    Busca en el WHERE una condición `restaurant_id == x`, `id == x` o
+    `table_id == x` sobre una tabla particionada y devuelve su shard.
+    """
+    found = set()
+
+    def visit_binary(binary):
+        column, value = binary.left, binary.right
+        if binary.operator is not operators.eq or not isinstance(value, sa.BindParameter):
+            return
+        table = getattr(column, 'table', None)
+        if table is None or getattr(table, 'name', None) not in SHARDED_TABLES:
+            return
+        v = value.effective_value
+        if v is None:
+            return
+        if column.name == 'restaurant_id':
+            found.add(shard_for(v))
+        elif column.name in ('id', 'table_id'):
+            found.add(shard_for_id(v))
+
+    visitors.traverse(clause, {}, {'binary': visit_binary})
+    found.discard(None)
+    return found.pop() if len(found) == 1 else None
+
+
+def _shard_chooser(mapper, instance, clause=None, **kw):
+    if not _is_sharded(mapper):
+        return GLOBAL
+    if instance is not None:
+        return _instance_shard(instance)
+    shard_id = _shard_from_criteria(clause) if clause is not None else None
+    if shard_id is None:
+        raise sa.exc.UnboundExecutionError(
+            f'No se puede determinar el shard para {mapper}: filtra por restaurant_id o id'
+        )
+    return shard_id
+
+
+def _identity_chooser(mapper, primary_key, **kw):
+    if not _is_sharded(mapper):
+        return [GLOBAL]
+    if sa.inspect(mapper).class_ is UserSummary:
+        return shard_ids()  # el user_id no dice en qué shard está
+    shard_id = shard_for_id(primary_key[0])
+    return [shard_id] if shard_id else []
+
+
+def _execute_chooser(orm_context):
+    if not _is_sharded(orm_context.bind_mapper):
+        return [GLOBAL]
+    shard_id = _shard_from_criteria(orm_context.statement)
+    # Sin criterio de enrutado la consulta se reparte entre todos los shards
+    return [shard_id] if shard_id else shard_ids()
+
+
+class ShardedFlaskSession(ShardedSession):
+    """
+    Sesión de Flask-SQLAlchemy que reparte `Table` y `Reservation` entre
+    los shards (binds `shard_N` de SQLALCHEMY_BINDS) y deja el resto de
+    modelos (usuarios, restaurantes) en la base de datos global.
+    `UserSummary` también vive en los shards: cada uno guarda la parte del
+    resumen de las reservas que contiene.
+    """
+
+    def __init__(self, db, **kwargs):
+        engines = db.engines
+        shards = {GLOBAL: engines[None]}
+        shards.update({key: engines[key] for key in shard_ids()})
+        super().__init__(
+            shard_chooser=_shard_chooser,
+            identity_chooser=_identity_chooser,
+            execute_chooser=_execute_chooser,
+            shards=shards,
+            **kwargs
+        )
+        self._db = db
+        self._model_changes = {}
+        self._shards = shards
+
+    def get_bind(self, mapper=None, *, shard_id=None, instance=None, clause=None, **kw):
+        if not _is_sharded(mapper):
+            # Los lazy loads desde una reserva llegan con el shard del padre
+            return self._shards[GLOBAL]
+
+        if shard_id in (None, GLOBAL):
+            # p.ej. Restaurant.tables: el padre es global, el hijo está en un shard
+            if instance is not None:
+                shard_id = _instance_shard(instance)
+            elif clause is not None:
+                shard_id = _shard_from_criteria(clause)
+            if shard_id is None:
+                raise sa.exc.UnboundExecutionError(
+                    f'No se puede determinar el shard para {mapper}: filtra por restaurant_id o id'
+                )
+        return self._shards[shard_id]
+
+
+class AppSession(Session):
+    """
+    Clase de sesión de `db`: crea una ShardedFlaskSession si la app activa
+    tiene SHARD_COUNT > 0 y una sesión normal si no. La decisión se toma por
+    app, así en un mismo proceso pueden convivir apps con y sin shards.
+    """
+
+    def __new__(cls, db=None, **kwargs):
+        if is_enabled():
+            # No es subclase de `cls`: Python no vuelve a llamar a __init__
+            return ShardedFlaskSession(db, **kwargs)
+        return super().__new__(cls)
+
+
+def init_sharding(app):
+    """Instala la sesión que activa el modo particionado en las apps con SHARD_COUNT > 0"""
+    db.session.session_factory.class_ = AppSession
+
+
+def fan_out(query, key=None, reverse=False):
+    """
+    Ejecuta la consulta en cada shard y mezcla los resultados.
+    Si se indica `key`, cada shard debe devolver sus filas ya ordenadas por
+    esa clave y el resultado se combina manteniendo el orden global.
+    """
+    if not is_enabled():
+        return query.all()
+    partial = [query.execution_options(_sa_shard_id=s).all() for s in shard_ids()]
+    if key is None:
+        return list(itertools.chain.from_iterable(partial))
+    return list(heapq.merge(*partial, key=key, reverse=reverse))
+
+
+def fan_out_page(query, page, per_page, key, reverse=False):
+    """
+    Página `page` (empezando en 1) de una consulta ordenada por `key`.
+    En modo particionado cada shard devuelve sus primeras filas y se mezclan.
+
+    Returns:
+        tuple: (filas de la página, hay_pagina_siguiente)
+    """
+    offset = (page - 1) * per_page
+    if not is_enabled():
+        filas = query.offset(offset).limit(per_page + 1).all()
+    else:
+        filas = fan_out(query.limit(offset + per_page + 1), key=key, reverse=reverse)[offset:]
+    return filas[:per_page], len(filas) > per_page
+
+
+def fan_out_count(query):
+    """`query.count()` sumado sobre todos los shards"""
+    if not is_enabled():
+        return query.count()
+    return sum(query.execution_options(_sa_shard_id=s).count() for s in shard_ids())
+
+
+def create_shards():
+    """Crea las tablas de cada shard y fija el inicio de su rango de ids"""
+    for index, key in enumerate(shard_ids()):
+        engine = db.engines[key]
+        base = (index + 1) * SHARD_ID_SPAN
+        with engine.begin() as conn:
+            UserSummary.__table__.create(conn, checkfirst=True)
+            for model in (Table, Reservation):
+                model.__table__.create(conn, checkfirst=True)
+                conn.execute(
+                    sa.text(
+                        'INSERT INTO sqlite_sequence (name, seq) SELECT :name, :seq '
+                        'WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = :name)'
+                    ),
+                    {'name': model.__tablename__, 'seq': base}
+                )
+
+
+def _shard_files():
+    """Archivos de shard existentes en disco, incluidos los que sobran tras reducir SHARD_COUNT"""
+    template = current_app.config['SHARD_PATH_TEMPLATE']
+    pattern = re.compile(re.escape(template).replace(r'\{\}', r'(\d+)') + '$')
+    files = {}
+    for path in glob.glob(template.format('*')):
+        match = pattern.match(path)
+        if match:
+            files[shard_key(int(match.group(1)))] = path
+    return files
+
+
+def rebalance():
+    """
+    Mueve mesas y reservas al shard que les corresponde según `shard_for`.
+
+    Recorre la base de datos global (datos de antes de activar el modo
+    particionado) y todos los archivos de shard. Los datos de cada
+    restaurante se copian juntos con ids nuevos del rango del shard
+    destino y después se borran del origen. Debe ejecutarse con la
+    aplicación detenida.
+
+    Cada reserva movida deja un evento 'reubicada' en la auditoría con su
+    id antiguo y el nuevo, así el historial de la reserva sigue enlazado.
+    Los resúmenes de perfil de sus usuarios se borran (guardan ids y
+    reparto antiguos) y se reconstruyen en la siguiente visita al perfil.
+
+    Returns:
+        list: [(restaurant_id, origen, destino, ids_mesas, ids_reservas), ...]
+        donde ids_mesas e ids_reservas son diccionarios {id antiguo: id nuevo}
+    """
+    sources = {GLOBAL: db.engines[None]}
+    for key, path in sorted(_shard_files().items()):
+        sources[key] = db.engines[key] if key in db.engines else sa.create_engine(f'sqlite:///{path}')
+
+    tables_t, reservations_t, summaries_t = Table.__table__, Reservation.__table__, UserSummary.__table__
+    movimientos = []
+    usuarios = set()
+
+    for origen, source in sources.items():
+        if not sa.inspect(source).has_table(tables_t.name):
+            continue
+        with source.connect() as conn:
+            restaurantes = conn.execute(
+                sa.union(
+                    sa.select(tables_t.c.restaurant_id),
+                    sa.select(reservations_t.c.restaurant_id)
+                )
+            ).scalars().all()
+
+        for restaurant_id in restaurantes:
+            destino = shard_for(restaurant_id)
+            if destino == origen:
+                continue
+            # El destino confirma antes que el origen: si algo falla, se duplica, no se pierde
+            with source.begin() as src:
+                with db.engines[destino].begin() as dst:
+                    nuevos_ids, reservas_ids = {}, {}
+                    mesas = src.execute(
+                        sa.select(tables_t).where(tables_t.c.restaurant_id == restaurant_id)
+                    ).mappings().all()
+                    for mesa in mesas:
+                        fila = dict(mesa)
+                        viejo_id = fila.pop('id')
+                        nuevos_ids[viejo_id] = dst.execute(
+                            sa.insert(tables_t).values(**fila)
+                        ).inserted_primary_key[0]
+
+                    reservas = src.execute(
+                        sa.select(reservations_t).where(reservations_t.c.restaurant_id == restaurant_id)
+                    ).mappings().all()
+                    for reserva in reservas:
+                        fila = dict(reserva)
+                        viejo_id = fila.pop('id')
+                        fila['table_id'] = nuevos_ids.get(fila['table_id'], fila['table_id'])
+                        reservas_ids[viejo_id] = dst.execute(
+                            sa.insert(reservations_t).values(**fila)
+                        ).inserted_primary_key[0]
+
+                src.execute(sa.delete(reservations_t).where(reservations_t.c.restaurant_id == restaurant_id))
+                src.execute(sa.delete(tables_t).where(tables_t.c.restaurant_id == restaurant_id))
+
+            usuarios.update(reserva['user_id'] for reserva in reservas)
+            for reserva in reservas:
+                audit_log.record('reubicada', reserva['id'], restaurant_id, None,
+                                 reserva['estado'], reserva['estado'],
+                                 reserva_id_nuevo=reservas_ids[reserva['id']])
+            movimientos.append((restaurant_id, origen, destino, nuevos_ids, reservas_ids))
+
+    if usuarios:
+        for engine in {**sources, **{key: db.engines[key] for key in shard_ids()}}.values():
+            if sa.inspect(engine).has_table(summaries_t.name):
+                with engine.begin() as conn:
+                    conn.execute(sa.delete(summaries_t).where(summaries_t.c.user_id.in_(usuarios)))
+
+    return movimientos
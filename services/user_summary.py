@@ -0,0 +1,215 @@
+import json
+from datetime import datetime
+
+from sqlalchemy.orm import selectinload
+
+from models import Reservation, User, UserSummary, db
+from services import sharding
+
+ESTADO_COLUMNAS = {
+    'PENDIENTE': 'pendientes',
+    'ACEPTADA': 'aceptadas',
+    'CANCELADA': 'canceladas',
+}
+ESTADOS_ACTIVOS = ('PENDIENTE', 'ACEPTADA')
+
+
+def _entrada(reserva, restaurante, mesa):
+    return {
+        'id': reserva.id,
+        'fecha_hora': reserva.fecha_hora.isoformat(timespec='minutes'),
+        'restaurante': restaurante.nombre,
+        'direccion': restaurante.direccion,
+        'mesa': mesa.numero if mesa else None,
+        'num_personas': reserva.num_personas,
+        'estado': reserva.estado,
+    }
+
+
+def _dumps(entradas):
+    entradas.sort(key=lambda e: e['fecha_hora'])
+    return json.dumps(entradas, separators=(',', ':'))
+
+
+def _shard_de(reserva):
+    """Shard cuya parte del resumen cubre la reserva (None sin modo particionado)"""
+    return sharding.shard_for(reserva.restaurant_id) if sharding.is_enabled() else None
+
+
+def _en_shard(query, shard):
+    return query.execution_options(_sa_shard_id=shard) if shard else query
+
+
+def _partes():
+    return sharding.shard_ids() if sharding.is_enabled() else [None]
+
+
+class UserSummaryService:
+    """
+    Mantiene el resumen por usuario (contadores por estado y próximas reservas)
+    que usa la página de perfil. Las rutas de reserva y cancelación aplican
+    el cambio en la misma transacción; el historial completo se consulta aparte.
+
+    En modo particionado cada shard guarda la parte del resumen de las
+    reservas que contiene, así actualizarlo solo toma el bloqueo del shard
+    que la reserva ya tiene y no el de la base de datos global.
+    """
+
+    @staticmethod
+    def load_profile(user_id):
+        """
+        Carga el usuario y su resumen (una consulta; en modo particionado una
+        más por shard). Las partes que falten se construyen desde el historial.
+
+        Returns:
+            tuple: (User, UserSummary) o (None, None) si el usuario no existe
+        """
+        if not sharding.is_enabled():
+            fila = db.session.query(User, UserSummary).outerjoin(
+                UserSummary, UserSummary.user_id == User.id
+            ).filter(User.id == user_id).first()
+            if fila is None:
+                return None, None
+            user, resumen = fila
+            if resumen is None:
+                resumen = UserSummaryService.rebuild(user_id)
+            return user, resumen
+
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None, None
+        partes = []
+        for shard in sharding.shard_ids():
+            parte = db.session.get(UserSummary, user_id, identity_token=shard)
+            partes.append(parte if parte is not None else UserSummaryService.rebuild(user_id, shard))
+        return user, _combinar(user_id, partes)
+
+    @staticmethod
+    def rebuild(user_id, shard=None):
+        """Recalcula el resumen (o su parte en `shard`) desde las reservas del usuario"""
+        reservas = _en_shard(
+            Reservation.query.filter_by(user_id=user_id).options(
+                selectinload(Reservation.restaurant), selectinload(Reservation.table)
+            ),
+            shard
+        ).all()
+        resumen = db.session.get(UserSummary, user_id, identity_token=shard)
+        if resumen is None:
+            resumen = UserSummary(user_id=user_id)
+            resumen._shard_id = shard
+            db.session.add(resumen)
+
+        ahora = datetime.now()
+        resumen.total = len(reservas)
+        for columna in ESTADO_COLUMNAS.values():
+            setattr(resumen, columna, 0)
+        proximas = []
+        for reserva in reservas:
+            columna = ESTADO_COLUMNAS.get(reserva.estado)
+            if columna:
+                setattr(resumen, columna, getattr(resumen, columna) + 1)
+            if reserva.estado in ESTADOS_ACTIVOS and reserva.fecha_hora >= ahora:
+                proximas.append(_entrada(reserva, reserva.restaurant, reserva.table))
+        resumen.proximas = _dumps(proximas)
+        db.session.commit()
+        return resumen
+
+    @staticmethod
+    def reservation_created(reserva, restaurante=None, mesa=None):
+        """Llamar tras `flush()` (la reserva ya tiene id) y antes de `commit()`"""
+        UserSummaryService._apply(
+            reserva, None, reserva.estado,
+            lambda: _entrada(reserva, restaurante or reserva.restaurant, mesa or reserva.table)
+        )
+
+    @staticmethod
+    def reservation_changed(reserva, estado_anterior):
+        """Llamar tras cambiar `reserva.estado` y antes de `commit()`"""
+        UserSummaryService._apply(
+            reserva, estado_anterior, reserva.estado,
+            lambda: _entrada(reserva, reserva.restaurant, reserva.table)
+        )
+
+    @staticmethod
+    def reservation_deleted(reserva):
+        """Llamar antes de borrar la reserva"""
+        UserSummaryService._apply(reserva, reserva.estado, None, None)
+
+    @staticmethod
+    def invalidate(user_ids, shard=None):
+        """
+        Borra el resumen de esos usuarios (solo la parte de `shard` si se indica)
+        para que se reconstruya en la siguiente visita al perfil.
+        """
+        if not user_ids:
+            return
+        for parte in ([shard] if shard else _partes()):
+            _en_shard(UserSummary.query.filter(UserSummary.user_id.in_(user_ids)), parte).delete(
+                synchronize_session=False
+            )
+
+    @staticmethod
+    def invalidate_restaurant(restaurant_id, table_id=None):
+        """
+        Invalida los resúmenes que muestran datos de un restaurante (o de una
+        de sus mesas). Llamar antes de `commit()` al editarlo o borrarlo.
+        """
+        query = db.session.query(Reservation.user_id).filter(Reservation.restaurant_id == restaurant_id)
+        if table_id is not None:
+            query = query.filter(Reservation.table_id == table_id)
+        user_ids = [user_id for (user_id,) in query.distinct()]
+        shard = sharding.shard_for(restaurant_id) if sharding.is_enabled() else None
+        UserSummaryService.invalidate(user_ids, shard)
+
+    @staticmethod
+    def _apply(reserva, estado_anterior, estado_nuevo, crear_entrada):
+        deltas = {}
+        if estado_anterior is not None:
+            deltas['total'] = deltas.get('total', 0) - 1
+            if estado_anterior in ESTADO_COLUMNAS:
+                deltas[ESTADO_COLUMNAS[estado_anterior]] = -1
+        if estado_nuevo is not None:
+            deltas['total'] = deltas.get('total', 0) + 1
+            if estado_nuevo in ESTADO_COLUMNAS:
+                columna = ESTADO_COLUMNAS[estado_nuevo]
+                deltas[columna] = deltas.get(columna, 0) + 1
+        deltas = {c: d for c, d in deltas.items() if d}
+
+        # La parte del resumen está en la misma base de datos que la reserva:
+        # no añade ningún bloqueo a la transacción de la reserva
+        shard = _shard_de(reserva)
+        if deltas:
+            # UPDATE atómico primero: en SQLite toma el bloqueo de escritura y
+            # serializa la lectura-modificación de `proximas` que viene después
+            actualizados = _en_shard(UserSummary.query.filter_by(user_id=reserva.user_id), shard).update(
+                {getattr(UserSummary, c): getattr(UserSummary, c) + d for c, d in deltas.items()},
+                synchronize_session=False
+            )
+            if not actualizados:
+                return  # sin resumen todavía: se construirá al visitar el perfil
+
+        resumen = db.session.get(UserSummary, reserva.user_id, identity_token=shard, populate_existing=True)
+        if resumen is None:
+            return
+
+        ahora = datetime.now().isoformat(timespec='minutes')
+        proximas = [e for e in json.loads(resumen.proximas)
+                    if e['id'] != reserva.id and e['fecha_hora'] >= ahora]
+        if estado_nuevo in ESTADOS_ACTIVOS and reserva.fecha_hora >= datetime.now():
+            proximas.append(crear_entrada())
+        resumen.proximas = _dumps(proximas)
+
+
+def _combinar(user_id, partes):
+    """Resumen completo (sin guardar) a partir de las partes de cada shard"""
+    resumen = UserSummary(user_id=user_id, total=0, proximas='[]')
+    for columna in ESTADO_COLUMNAS.values():
+        setattr(resumen, columna, 0)
+    proximas = []
+    for parte in partes:
+        resumen.total += parte.total
+        for columna in ESTADO_COLUMNAS.values():
+            setattr(resumen, columna, getattr(resumen, columna) + getattr(parte, columna))
+        proximas.extend(json.loads(parte.proximas))
+    resumen.proximas = _dumps(proximas)
+    return resumen
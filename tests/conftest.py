@@ -0,0 +1,68 @@
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from config import Config  # noqa: E402
+from models import Reservation, Restaurant, Table, User, db  # noqa: E402
+from services import sharding  # noqa: E402
+from services.audit_log import audit_log  # noqa: E402
+
+
+def make_app(tmp_path, shard_count):
+    """App con la base de datos global, los shards y la auditoría dentro de `tmp_path`"""
+    template = str(tmp_path / 'shard_{}.db')
+
+    class TestConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'global.db'}"
+        SHARD_COUNT = shard_count
+        SHARD_PATH_TEMPLATE = template
+        SQLALCHEMY_BINDS = {f'shard_{i}': f"sqlite:///{template.format(i)}" for i in range(shard_count)}
+        AUDIT_DIR = str(tmp_path / 'audit')
+
+    app = create_app(TestConfig)
+    with app.app_context():
+        # Solo la base global: `db` recuerda los binds de otras apps del mismo proceso
+        db.create_all(bind_key=None)
+        if sharding.is_enabled():
+            sharding.create_shards()
+    return app
+
+
+def crear_datos(restaurantes=4, reservas_por_mesa=2):
+    """Un usuario y, por restaurante, dos mesas con algunas reservas"""
+    user = User(email='cliente@example.com', role='CLIENTE')
+    user.set_password('secreto')
+    db.session.add(user)
+    db.session.commit()
+
+    inicio = datetime(2030, 1, 1, 20, 0)
+    for n in range(restaurantes):
+        restaurante = Restaurant(nombre=f'R{n}', direccion='Calle 1')
+        db.session.add(restaurante)
+        db.session.commit()
+        for numero in (1, 2):
+            mesa = Table(numero=numero, capacidad=4, restaurant_id=restaurante.id)
+            db.session.add(mesa)
+            db.session.flush()
+            for k in range(reservas_por_mesa):
+                db.session.add(Reservation(
+                    user_id=user.id, restaurant_id=restaurante.id, table_id=mesa.id,
+                    fecha_hora=inicio + timedelta(days=k, hours=numero), num_personas=2
+                ))
+        db.session.commit()
+    return user.id
+
+
+@pytest.fixture
+def sharded_app(tmp_path):
+    app = make_app(tmp_path, 2)
+    with app.app_context():
+        yield app
+        db.session.remove()
+    audit_log.close()
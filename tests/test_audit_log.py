@@ -0,0 +1,73 @@
+import json
+import threading
+import time
+
+import pytest
+
+from conftest import crear_datos, make_app
+from models import Table, db
+from services import availability_feed
+from services.audit_log import AuditLog, audit_log, iter_events
+
+
+def escribir_segmento(directory, nombre, eventos):
+    with open(directory / nombre, 'w') as fh:
+        for ts, reserva_id in eventos:
+            fh.write(json.dumps({'ts': ts, 'accion': 'creada', 'reserva_id': reserva_id,
+                                 'restaurant_id': 1, 'actor_id': 7, 'estado_anterior': None,
+                                 'estado': 'PENDIENTE', 'reserva_id_nuevo': None},
+                                separators=(',', ':')) + '\n')
+
+
+def test_segmentos_de_varios_workers_en_orden_cronologico(tmp_path):
+    escribir_segmento(tmp_path, 'audit-20300101000000-100-0001.jsonl',
+                      [('2030-01-01T10:00:00.000', 1), ('2030-01-01T10:00:02.000', 3)])
+    escribir_segmento(tmp_path, 'audit-20300101000000-200-0001.jsonl',
+                      [('2030-01-01T10:00:01.000', 2), ('2030-01-01T10:00:03.000', 4)])
+
+    assert [e['reserva_id'] for e in iter_events(str(tmp_path))] == [1, 2, 3, 4]
+    assert [e['reserva_id'] for e in iter_events(str(tmp_path), actor_id=7)] == [1, 2, 3, 4]
+    assert [e['reserva_id'] for e in iter_events(str(tmp_path), reserva_id=3)] == [3]
+
+
+def test_cola_llena_no_desordena_el_segmento(tmp_path):
+    log = AuditLog()
+    log.directory = str(tmp_path)
+    log.queue_size, log.batch_size, log.flush_interval = 5, 500, 0.05
+    log.segment_max_bytes = 1024 * 1024
+    log._ensure_started()
+
+    with log._write_lock:  # el escritor se queda con el primer evento sin poder escribirlo
+        for reserva_id in range(1, 7):
+            log.record('creada', reserva_id, 1, 7)
+        lleno = threading.Thread(target=log.record, args=('creada', 7, 1, 7))
+        lleno.start()  # la cola está llena: espera a que haya sitio
+        time.sleep(0.2)
+    lleno.join()
+    log.close()
+
+    assert [e['reserva_id'] for e in iter_events(str(tmp_path))] == [1, 2, 3, 4, 5, 6, 7]
+
+
+def test_el_evento_se_encola_antes_de_publicar_el_cambio(tmp_path, monkeypatch):
+    app = make_app(tmp_path, 0)
+    with app.app_context():
+        user_id = crear_datos(restaurantes=1)
+        mesa = Table.query.first()
+        mesa_id, restaurant_id = mesa.id, mesa.restaurant_id
+        db.session.remove()
+
+    def falla(*args, **kwargs):
+        raise RuntimeError('fallo al publicar')
+
+    monkeypatch.setattr(availability_feed, 'publish_reservation_change', falla)
+    client = app.test_client()
+    with client.session_transaction() as s:
+        s['user_id'], s['role'], s['email'] = user_id, 'CLIENTE', 'cliente@example.com'
+    with pytest.raises(RuntimeError):
+        client.post('/reserve', data={'restaurant_id': restaurant_id, 'fecha_hora': '2030-03-01T20:00',
+                                      'mesa_id': mesa_id, 'num_personas': 2})
+    audit_log.close()
+
+    eventos = list(iter_events(app.config['AUDIT_DIR'], actor_id=user_id))
+    assert [(e['accion'], e['estado']) for e in eventos] == [('creada', 'PENDIENTE')]
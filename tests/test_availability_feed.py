@@ -0,0 +1,152 @@
+import os
+import queue
+import time
+from datetime import datetime, timedelta
+
+import pytest
+import sqlalchemy as sa
+
+from conftest import crear_datos, make_app
+from models import Reservation, Table, db
+from services import availability_feed
+from services.reservation_service import ReservationService
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = make_app(tmp_path, 0)
+    with app.app_context():
+        yield app
+        db.session.remove()
+
+
+def cliente(app, user_id):
+    client = app.test_client()
+    with client.session_transaction() as s:
+        s['user_id'] = user_id
+        s['role'] = 'CLIENTE'
+        s['email'] = 'cliente@example.com'
+    return client
+
+
+def test_un_fallo_del_feed_no_rompe_la_reserva(app, monkeypatch):
+    user_id = crear_datos(restaurantes=1)
+    mesa = Table.query.filter_by(numero=1).first()
+    fecha_hora = datetime(2030, 3, 1, 20, 0)
+    key = (mesa.restaurant_id, fecha_hora.date())
+    q = availability_feed.broker.subscribe(key)
+
+    def falla(*args, **kwargs):
+        raise sa.exc.OperationalError('SELECT', {}, Exception('database is locked'))
+
+    monkeypatch.setattr(ReservationService, 'get_busy_intervals', staticmethod(falla))
+    try:
+        respuesta = cliente(app, user_id).post('/reserve', data={
+            'restaurant_id': mesa.restaurant_id,
+            'fecha_hora': fecha_hora.strftime('%Y-%m-%dT%H:%M'),
+            'mesa_id': mesa.id,
+            'num_personas': 2,
+        })
+    finally:
+        availability_feed.broker.unsubscribe(key, q)
+
+    assert respuesta.status_code == 302
+    assert Reservation.query.filter_by(fecha_hora=fecha_hora).count() == 1
+
+
+def test_un_suscriptor_lento_recibe_resync_en_vez_de_crecer():
+    broker = availability_feed.AvailabilityBroker(max_queue=3)
+    lento, al_dia = broker.subscribe('canal'), broker.subscribe('otro')
+    for n in range(5):
+        broker.publish('canal', {'n': n})
+
+    # Se descartan los pendientes: RESYNC y después solo lo que llegó tras él
+    assert lento.get_nowait() is availability_feed.AvailabilityBroker.RESYNC
+    assert lento.get_nowait() == {'n': 4}
+    assert lento.empty() and al_dia.empty()
+
+    broker.resync_all()
+    assert lento.get_nowait() is availability_feed.AvailabilityBroker.RESYNC
+    assert al_dia.get_nowait() is availability_feed.AvailabilityBroker.RESYNC
+
+
+def estado_cliente(q, restaurant_id, fecha, estado):
+    """Aplica los eventos pendientes como lo hace el navegador: deltas y snapshots"""
+    while True:
+        try:
+            evento = q.get(timeout=1)
+        except queue.Empty:
+            return estado
+        if evento is availability_feed.AvailabilityBroker.RESYNC:
+            estado = availability_feed.snapshot(restaurant_id, fecha)['mesas']
+        else:
+            estado[str(evento['table_id'])] = evento['ocupado']
+
+
+def test_rafaga_entre_workers_mayor_que_la_cola_del_socket(app, tmp_path, monkeypatch):
+    crear_datos(restaurantes=1)
+    mesas = [m.id for m in Table.query.all()]
+    user_id = Reservation.query.first().user_id
+    fecha = datetime(2030, 3, 1).date()
+    key = (1, fecha)
+
+    app.config['AVAILABILITY_BUS_DIR'] = str(tmp_path / 'bus')
+    os.mkdir(app.config['AVAILABILITY_BUS_DIR'])
+    q = availability_feed.broker.subscribe(key)
+    estado = availability_feed.snapshot(*key)['mesas']
+    availability_feed.bus.start(app)
+
+    # Receptor atascado hasta que el otro worker termina la ráfaga: la cola del
+    # socket (net.unix.max_dgram_qlen) se llena y se pierden los últimos cambios
+    leer, escribir = os.pipe()
+    original = availability_feed._publish_local
+    atascado = [True]
+
+    def lento(*args):
+        if atascado:
+            os.read(leer, 1)
+            atascado.clear()
+        original(*args)
+
+    monkeypatch.setattr(availability_feed, '_publish_local', lento)
+
+    cambios = []
+    for n in range(60):
+        fecha_hora = datetime(2030, 3, 1, 8, 0) + timedelta(minutes=10 * n)
+        mesa_id = mesas[n // 30]  # los cambios de la segunda mesa llegan con la cola llena
+        db.session.add(Reservation(user_id=user_id, restaurant_id=1, table_id=mesa_id,
+                                   fecha_hora=fecha_hora, num_personas=2))
+        cambios.append({'restaurant_id': 1, 'table_id': mesa_id,
+                        'fecha_hora': fecha_hora.isoformat(), 'accion': 'creada'})
+    db.session.commit()
+    db.session.remove()
+
+    # Otro worker (otro pid) publica la ráfaga
+    pid = os.fork()
+    if pid == 0:
+        codigo = 1
+        try:
+            for cambio in cambios:
+                availability_feed.bus.send(app.config['AVAILABILITY_BUS_DIR'], cambio)
+            os.write(escribir, b'x')
+            # Esperar a que salgan los RESYNC de los workers que se quedaron sin sitio
+            limite = time.monotonic() + 10
+            while getattr(availability_feed.bus, '_pendientes', None) and time.monotonic() < limite:
+                time.sleep(0.05)
+            codigo = 0 if not getattr(availability_feed.bus, '_pendientes', None) else 2
+        finally:
+            os._exit(codigo)
+    _, status = os.waitpid(pid, 0)
+    os.close(escribir)
+
+    try:
+        assert os.waitstatus_to_exitcode(status) == 0
+        final = estado_cliente(q, *key, estado)
+    finally:
+        availability_feed.broker.unsubscribe(key, q)
+        availability_feed.bus.close()
+        os.close(leer)
+
+    esperado = availability_feed.snapshot(*key)['mesas']
+    assert final == esperado
+    assert all(len(esperado[str(m)]) == 30 for m in mesas)
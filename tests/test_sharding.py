@@ -0,0 +1,142 @@
+import pytest
+
+from conftest import crear_datos, make_app
+from models import Reservation, Restaurant, Table, db
+from services import sharding
+from services.audit_log import audit_log, iter_events
+
+
+def test_ids_en_el_rango_del_shard(sharded_app):
+    crear_datos()
+    for model in (Table, Reservation):
+        for fila in sharding.fan_out(model.query):
+            assert sharding.shard_for_id(fila.id) == sharding.shard_for(fila.restaurant_id)
+
+
+def test_enrutado_por_criterio(sharded_app):
+    crear_datos()
+    reserva = Reservation.query.filter_by(restaurant_id=1).first()
+    mesa_de_otro_shard = Table.query.filter_by(restaurant_id=2).first()
+    shard = sharding.shard_for(1)
+
+    def shard_de(query):
+        return sharding._shard_from_criteria(query.statement)
+
+    assert shard_de(Reservation.query.filter_by(restaurant_id=1)) == shard
+    assert shard_de(Reservation.query.filter_by(id=reserva.id)) == shard
+    assert shard_de(Reservation.query.filter_by(table_id=reserva.table_id)) == shard
+    assert shard_de(Table.query.filter(Table.id == reserva.table_id)) == shard
+    # Sin criterio, o con criterios de shards distintos, no hay un único shard
+    assert shard_de(Reservation.query.filter_by(user_id=reserva.user_id)) is None
+    assert shard_de(Reservation.query.filter(
+        Reservation.restaurant_id == 1, Reservation.table_id == mesa_de_otro_shard.id
+    )) is None
+
+
+def test_get_por_id_y_consulta_sin_criterio(sharded_app):
+    user_id = crear_datos()
+    ids = {r.id for r in sharding.fan_out(Reservation.query)}
+    db.session.remove()
+
+    for reserva_id in ids:
+        assert db.session.get(Reservation, reserva_id).id == reserva_id
+    assert db.session.get(Reservation, 1) is None  # fuera de cualquier rango
+    # Una consulta sin criterio de enrutado se reparte entre todos los shards
+    assert {r.id for r in Reservation.query.filter_by(user_id=user_id).all()} == ids
+
+
+def test_lazy_loads_entre_global_y_shards(sharded_app):
+    crear_datos()
+    db.session.remove()
+
+    for restaurante in Restaurant.query.all():
+        # Padre global -> hijos en el shard del restaurante
+        assert sorted(m.numero for m in restaurante.tables) == [1, 2]
+        reservas = Reservation.query.filter_by(restaurant_id=restaurante.id).all()
+        assert len(reservas) == 4
+        for reserva in reservas:
+            # Hijo en un shard -> padres global y en el mismo shard
+            assert reserva.restaurant.id == restaurante.id
+            assert reserva.table.restaurant_id == restaurante.id
+            assert reserva.user.email == 'cliente@example.com'
+
+
+def test_borrado_en_cascada_desde_el_restaurante(sharded_app):
+    crear_datos()
+    restaurante = Restaurant.query.first()
+    restaurante_id = restaurante.id
+    Reservation.query.filter_by(restaurant_id=restaurante_id).delete()
+    db.session.delete(restaurante)
+    db.session.commit()
+
+    assert Table.query.filter_by(restaurant_id=restaurante_id).count() == 0
+    assert sharding.fan_out_count(Table.query) == 6
+
+
+def test_fan_out_ordenado_y_paginado(sharded_app):
+    crear_datos()
+    query = Reservation.query.order_by(Reservation.fecha_hora.desc(), Reservation.id.desc())
+    key = lambda r: (r.fecha_hora, r.id)  # noqa: E731
+
+    todas = sharding.fan_out(query, key=key, reverse=True)
+    assert [key(r) for r in todas] == sorted((key(r) for r in todas), reverse=True)
+    assert sharding.fan_out_count(Reservation.query) == len(todas) == 16
+
+    pagina, hay_mas = sharding.fan_out_page(query, 2, 5, key=key, reverse=True)
+    assert [r.id for r in pagina] == [r.id for r in todas[5:10]]
+    assert hay_mas
+
+
+def test_rebalance_devuelve_y_audita_los_ids(tmp_path):
+    # Datos creados sin shards, en la base de datos global
+    plano = make_app(tmp_path, 0)
+    with plano.app_context():
+        crear_datos(restaurantes=3)
+        antes = {r.id: (r.restaurant_id, r.fecha_hora, r.table.numero) for r in Reservation.query.all()}
+        db.session.remove()
+
+    app = make_app(tmp_path, 2)
+    with app.app_context():
+        movimientos = sharding.rebalance()
+        assert {m[0] for m in movimientos} == {1, 2, 3}
+
+        mapa = {viejo: nuevo for m in movimientos for viejo, nuevo in m[4].items()}
+        assert set(mapa) == set(antes)
+        for viejo, nuevo in mapa.items():
+            reserva = db.session.get(Reservation, nuevo)
+            assert (reserva.restaurant_id, reserva.fecha_hora, reserva.table.numero) == antes[viejo]
+
+        assert sharding.rebalance() == []  # ya está todo en su shard
+        db.session.remove()
+    audit_log.close()
+
+    viejo, nuevo = next(iter(mapa.items()))
+    for reserva_id in (viejo, nuevo):
+        eventos = list(iter_events(app.config['AUDIT_DIR'], reserva_id=reserva_id))
+        assert [(e['accion'], e['reserva_id'], e['reserva_id_nuevo']) for e in eventos] == [
+            ('reubicada', viejo, nuevo)
+        ]
+
+
+def test_clase_de_sesion_por_app(tmp_path):
+    (tmp_path / 'a').mkdir()
+    (tmp_path / 'b').mkdir()
+    con_shards = make_app(tmp_path / 'a', 2)
+    sin_shards = make_app(tmp_path / 'b', 0)
+
+    with con_shards.app_context():
+        assert isinstance(db.session(), sharding.ShardedFlaskSession)
+    with sin_shards.app_context():
+        assert not isinstance(db.session(), sharding.ShardedFlaskSession)
+        crear_datos(restaurantes=1)
+        assert Reservation.query.count() == 4
+    with con_shards.app_context():
+        assert isinstance(db.session(), sharding.ShardedFlaskSession)
+
+
+@pytest.mark.parametrize('restaurant_id', [1, 2, 7])
+def test_shard_for_id_inverso_de_los_rangos(sharded_app, restaurant_id):
+    indice = restaurant_id % 2
+    base = (indice + 1) * sharding.SHARD_ID_SPAN
+    assert sharding.shard_for_id(base + 1) == sharding.shard_for(restaurant_id)
+    assert sharding.shard_for_id(base + sharding.SHARD_ID_SPAN) != sharding.shard_for(restaurant_id)
@@ -0,0 +1,111 @@
+from datetime import datetime
+
+import sqlalchemy as sa
+
+from conftest import crear_datos, make_app
+from models import Reservation, Restaurant, UserSummary, db
+from services import sharding
+from services.audit_log import audit_log
+from services.user_summary import UserSummaryService
+
+
+def partes(user_id):
+    return {shard: db.session.get(UserSummary, user_id, identity_token=shard, populate_existing=True)
+            for shard in sharding.shard_ids()}
+
+
+def test_cada_shard_guarda_su_parte_del_resumen(sharded_app):
+    user_id = crear_datos()
+    user, resumen = UserSummaryService.load_profile(user_id)
+
+    assert user.id == user_id
+    assert (resumen.total, resumen.pendientes) == (16, 16)
+    assert len(resumen.proximas_reservas(ahora=datetime(2029, 1, 1))) == 16
+    assert [p.total for p in partes(user_id).values()] == [8, 8]
+    with db.engines[None].connect() as conn:
+        assert conn.execute(sa.select(sa.func.count()).select_from(UserSummary.__table__)).scalar() == 0
+
+
+def test_una_reserva_solo_escribe_en_su_shard(sharded_app):
+    user_id = crear_datos()
+    UserSummaryService.load_profile(user_id)
+    reserva = Reservation.query.filter_by(restaurant_id=1).first()
+
+    escrituras = []
+
+    def registrar(conn, cursor, statement, *args):
+        if statement.split()[0] in ('INSERT', 'UPDATE', 'DELETE'):
+            escrituras.append(conn.engine)
+
+    for engine in db.engines.values():
+        sa.event.listen(engine, 'before_cursor_execute', registrar)
+    try:
+        nueva = Reservation(user_id=user_id, restaurant_id=1, table_id=reserva.table_id,
+                            fecha_hora=datetime(2030, 2, 1, 20, 0), num_personas=2)
+        db.session.add(nueva)
+        db.session.flush()
+        UserSummaryService.reservation_created(nueva)
+        db.session.commit()
+    finally:
+        for engine in db.engines.values():
+            sa.event.remove(engine, 'before_cursor_execute', registrar)
+
+    assert escrituras and set(escrituras) == {db.engines[sharding.shard_for(1)]}
+    totales = {shard: p.total for shard, p in partes(user_id).items()}
+    assert totales[sharding.shard_for(1)] == 9
+    assert totales[sharding.shard_for(2)] == 8
+
+
+def test_editar_un_restaurante_invalida_su_parte(sharded_app):
+    user_id = crear_datos()
+    UserSummaryService.load_profile(user_id)
+
+    db.session.get(Restaurant, 1).nombre = 'Nuevo nombre'
+    UserSummaryService.invalidate_restaurant(1)
+    db.session.commit()
+
+    restantes = partes(user_id)
+    assert restantes[sharding.shard_for(1)] is None
+    assert restantes[sharding.shard_for(2)] is not None
+
+    _, resumen = UserSummaryService.load_profile(user_id)
+    nombres = {e['restaurante'] for e in resumen.proximas_reservas(ahora=datetime(2029, 1, 1))}
+    assert 'Nuevo nombre' in nombres and 'R0' not in nombres
+
+
+def test_rebalance_invalida_los_resumenes_con_ids_viejos(tmp_path):
+    plano = make_app(tmp_path, 0)
+    with plano.app_context():
+        user_id = crear_datos(restaurantes=2)
+        _, resumen = UserSummaryService.load_profile(user_id)
+        assert resumen.total == 8
+        db.session.remove()
+
+    app = make_app(tmp_path, 2)
+    with app.app_context():
+        sharding.rebalance()
+        with db.engines[None].connect() as conn:
+            assert conn.execute(sa.select(sa.func.count()).select_from(UserSummary.__table__)).scalar() == 0
+
+        _, resumen = UserSummaryService.load_profile(user_id)
+        ids = [e['id'] for e in resumen.proximas_reservas(ahora=datetime(2029, 1, 1))]
+        assert len(ids) == 8
+        assert all(db.session.get(Reservation, i) is not None for i in ids)
+        db.session.remove()
+    audit_log.close()
+
+
+def test_sin_shards_el_resumen_vive_en_la_base_global(tmp_path):
+    app = make_app(tmp_path, 0)
+    with app.app_context():
+        user_id = crear_datos(restaurantes=1)
+        UserSummaryService.load_profile(user_id)
+
+        reserva = Reservation.query.first()
+        estado_anterior, reserva.estado = reserva.estado, 'CANCELADA'
+        UserSummaryService.reservation_changed(reserva, estado_anterior)
+        db.session.commit()
+
+        _, resumen = UserSummaryService.load_profile(user_id)
+        assert (resumen.total, resumen.pendientes, resumen.canceladas) == (4, 3, 1)
+        db.session.remove()